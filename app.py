@@ -1,15 +1,20 @@
 import io
+import functools
+import hashlib
+import html
 import json
 import os
 import re
 import smtplib
+import threading
 import zipfile
+from collections import Counter
 from datetime import datetime
 from email.message import EmailMessage
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
 
+import numpy as np
 import pandas as pd
+import requests
 import streamlit as st
 
 try:
@@ -30,15 +35,35 @@ except Exception:
     fb_credentials = None
     fb_firestore = None
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 # Optional OCR (works only if tesseract is installed on the host)
+# One label per call: Tesseract's OpenMP threads only add overhead.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 try:
     import pytesseract
-    from PIL import Image
+    from PIL import Image, ImageOps
 except Exception:
     pytesseract = None
     Image = None
+    ImageOps = None
 
 APP_TITLE = "PryPalScanner"
+OCR_MAX_SIDE = 1600
+# Labels hold a few lines of dark digits on a light background: LSTM engine,
+# uniform block mode, no inverted-text pass, digits only.
+OCR_CONFIG = "--oem 1 --psm 6 -c tessedit_do_invert=0 -c tessedit_char_whitelist=0123456789"
+# Written by now_ts() and parsed first when loading history.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_PRIVATE_KEY_RE = re.compile(r'"private_key"\s*:\s*"(.+?)"', re.S)
+_DRUM_RE = re.compile(r"(\d{5,})")
+_DIGITS_RE = re.compile(r"\d+")
+
+TRUTHY_VALUES = frozenset({"TRUE", "1", "YES", "Y"})
 
 TRANSLATIONS = {
     "RO": {
@@ -135,17 +160,50 @@ SHEET_TEMPLATES = {
     ],
 }
 
+# Firestore rejects write batches with more than 500 operations.
+FIRESTORE_BATCH_LIMIT = 500
+# Small config sheets every screen reads, fetched with one values.batchGet on gspread.
+# drums and pallets hold the history and are only downloaded when a screen asks for them.
+BATCHED_SHEETS = ("materials", "settings")
+# Seconds a cached header row is trusted before it is read from the sheet again.
+HEADERS_TTL = 300
+
+# Low-cardinality text columns, loaded as pandas categories.
+CATEGORY_COLUMNS = ("material_code", "prefix", "status", "drum_type", "pallet_id", "operator", "device_id")
+# Fields the operator screen reads from active drums (list, email body, undo).
+ACTIVE_DRUM_FIELDS = ("drum_number", "standard_qty", "timestamp")
+# High-cardinality identifiers, held as Arrow-backed strings.
+STRING_COLUMNS = ("drum_number",)
+# Whole-number columns the app writes itself, narrowed to the smallest integer dtype
+# when fully numeric. standard_qty stays text: it comes from labels (leading zeros).
+INTEGER_COLUMNS = ("count",)
+
 
 # -------------------- Utilities --------------------
 
+@functools.lru_cache(maxsize=64)
 def get_secret(key: str, default: str | None = None) -> str | None:
     if key in st.secrets:
         return st.secrets[key]
     return os.getenv(key, default)
 
+def json_dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def json_loads(data):
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the same error.
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=2)
 def parse_service_account_json(sa_json: str) -> dict:
     try:
-        return json.loads(sa_json)
+        return json_loads(sa_json)
     except json.JSONDecodeError:
         if "private_key" not in sa_json:
             raise
@@ -153,22 +211,30 @@ def parse_service_account_json(sa_json: str) -> dict:
             key = match.group(1)
             key = key.replace("\n", "\\n")
             return f"\"private_key\": \"{key}\""
-        fixed = re.sub(r'"private_key"\s*:\s*"(.+?)"', repl, sa_json, flags=re.S)
-        return json.loads(fixed)
+        fixed = _PRIVATE_KEY_RE.sub(repl, sa_json)
+        return json_loads(fixed)
 
 
 def now_ts() -> str:
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    # Same string as TIMESTAMP_FORMAT, without parsing a format string on every scan.
+    return datetime.utcnow().isoformat(sep=" ", timespec="seconds")
 
 def today_date() -> str:
-    return datetime.utcnow().strftime("%Y-%m-%d")
+    return datetime.utcnow().date().isoformat()
 
 def get_lang() -> str:
     return st.session_state.get("lang", "RO")
 
+def set_lang(lang: str):
+    st.session_state.lang = lang
+    st.session_state["_tr"] = TRANSLATIONS.get(lang, TRANSLATIONS["RO"])
+
 def t(key: str, **kwargs) -> str:
-    lang = get_lang()
-    text = TRANSLATIONS.get(lang, TRANSLATIONS["RO"]).get(key, key)
+    table = st.session_state.get("_tr")
+    if table is None:
+        table = TRANSLATIONS.get(get_lang(), TRANSLATIONS["RO"])
+        st.session_state["_tr"] = table
+    text = table.get(key, key)
     if kwargs:
         return text.format(**kwargs)
     return text
@@ -178,7 +244,7 @@ def parse_qr(raw: str) -> dict:
     # Example: "DWP1500_LV 15518289"
     raw = raw.strip()
     drum_number = None
-    match = re.search(r"(\d{5,})", raw)
+    match = _DRUM_RE.search(raw)
     if match:
         drum_number = match.group(1)
     return {
@@ -188,31 +254,52 @@ def parse_qr(raw: str) -> dict:
     }
 
 
+def prepare_ocr_image(img):
+    # Tesseract runtime scales with pixel count; a grayscale label capped at
+    # OCR_MAX_SIDE px is plenty for the digits we read.
+    img = img.convert("L")
+    img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE))
+    img = ImageOps.autocontrast(img)
+    # Binarize up front (Otsu on the histogram) so Tesseract gets a clean 2-level raster.
+    threshold = otsu_threshold(img)
+    return img.point([255 if level > threshold else 0 for level in range(256)])
+
+
+def otsu_threshold(img) -> int:
+    hist = np.asarray(img.histogram(), dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(hist * np.arange(256))
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    return int(np.argmax(weight_bg * weight_fg * (mean_bg - mean_fg) ** 2))
+
+
 def extract_ocr_fields(image_bytes: bytes, drum_number: str | None) -> dict:
     if pytesseract is None or Image is None:
         return {"material_code": None, "standard_qty": None, "raw_text": None}
     try:
-        img = Image.open(image_bytes)
-        text = pytesseract.image_to_string(img)
+        img = prepare_ocr_image(Image.open(image_bytes))
+        text = pytesseract.image_to_string(img, config=OCR_CONFIG)
     except Exception:
         return {"material_code": None, "standard_qty": None, "raw_text": None}
 
-    numbers = re.findall(r"\d+", text)
-    numbers = [n for n in numbers if n != (drum_number or "")]
-
+    skip = drum_number or ""
     material_code = None
     standard_qty = None
 
-    # Heuristic: material code often 8 digits (e.g., 60115949)
-    for n in numbers:
+    # Heuristic: material code often 8 digits (e.g., 60115949);
+    # standard quantity is the first shorter numeric value.
+    for match in _DIGITS_RE.finditer(text):
+        n = match.group(0)
+        if n == skip:
+            continue
         if len(n) == 8:
-            material_code = n
-            break
-
-    # Standard quantity: first remaining numeric value not 8 digits
-    for n in numbers:
-        if n != material_code and len(n) < 8:
+            if material_code is None:
+                material_code = n
+        elif len(n) < 8 and standard_qty is None:
             standard_qty = n
+        if material_code and standard_qty:
             break
 
     return {
@@ -228,7 +315,25 @@ def normalize_bool(value) -> bool:
         return False
     if isinstance(value, (int, float)):
         return value != 0
-    return str(value).strip().upper() in {"TRUE", "1", "YES", "Y"}
+    return str(value).strip().upper() in TRUTHY_VALUES
+
+def normalize_bool_series(values: pd.Series) -> pd.Series:
+    # normalize_bool for whole columns; vectorized only where the rules are dtype-wide.
+    if pd.api.types.is_bool_dtype(values):
+        return values.fillna(False).astype(bool)
+    if pd.api.types.is_numeric_dtype(values):
+        # NaN != 0 is True, as in normalize_bool; nullable NA counts as False.
+        return (values != 0).fillna(False).astype(bool)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Normalize the few categories, then map back through the integer codes;
+        # code -1 (missing) picks the trailing entry, normalize_bool(NaN).
+        truthy = normalize_bool_series(pd.Series(values.cat.categories)).to_numpy()
+        lookup = np.append(truthy, normalize_bool(np.nan))
+        return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index, dtype=bool)
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        return values.astype(str).str.strip().str.upper().isin(TRUTHY_VALUES)
+    # Genuinely mixed columns (text, numbers, bools, NaN); apply the scalar rules per value.
+    return values.map(normalize_bool).astype(bool)
 
 def build_email_subject(material_code: str, pallet_id: str) -> str:
     return t("email_subject", date=today_date(), material=material_code, pallet=pallet_id)
@@ -240,33 +345,65 @@ def build_email_body(material_code: str, description: str, pallet_id: str, drums
         lines.append(t("email_description", description=description))
     lines.append("Drum Number | Standard Quantity")
     if drums_df is not None and not drums_df.empty:
-        for _, row in drums_df.iterrows():
-            lines.append(f"{row.get('drum_number','')} | {row.get('standard_qty','')}")
+        body_df = drums_df.reindex(columns=["drum_number", "standard_qty"]).fillna("").astype(str)
+        lines.extend((body_df["drum_number"] + " | " + body_df["standard_qty"]).tolist())
     return "\n".join(lines)
 
 
+def _df_fingerprint(df: pd.DataFrame) -> bytes:
+    # Hash at most ~1M cells; object columns are hashed by value, not by pointer.
+    step = max(1, df.size // 1_000_000)
+    sample = df.iloc[::step]
+    digest = hashlib.md5(repr((df.shape, tuple(df.columns))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(sample, index=True).to_numpy().tobytes())
+    return digest.digest()
+
+
+# Only for the report builders, where serializing costs far more than hashing;
+# cheap lookups key on the worksheet (WORKSHEET_HASH_FUNCS) instead.
+REPORT_HASH_FUNCS = {pd.DataFrame: _df_fingerprint}
+
+
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs=REPORT_HASH_FUNCS)
 def build_report_zip(pallets_df: pd.DataFrame, drums_df: pd.DataFrame) -> bytes:
     pallets_df = pallets_df.drop(columns=["__row", "__doc_id"], errors="ignore")
     drums_df = drums_df.drop(columns=["__row", "__doc_id"], errors="ignore")
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("pallets.csv", pallets_df.to_csv(index=False))
-        zf.writestr("drums.csv", drums_df.to_csv(index=False))
+        for filename, df in (("pallets.csv", pallets_df), ("drums.csv", drums_df)):
+            # Stream straight into the archive entry instead of building the CSV string first.
+            with zf.open(filename, "w", force_zip64=True) as fh:
+                with io.TextIOWrapper(fh, encoding="utf-8", newline="") as text:
+                    df.to_csv(text, index=False, lineterminator="\n")
     buf.seek(0)
     return buf.getvalue()
 
 
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs=REPORT_HASH_FUNCS)
 def build_report_excel(pallets_df: pd.DataFrame, drums_df: pd.DataFrame) -> bytes:
     pallets_df = pallets_df.drop(columns=["__row", "__doc_id"], errors="ignore")
     drums_df = drums_df.drop(columns=["__row", "__doc_id"], errors="ignore")
     buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+    # constant_memory is not usable here: pandas writes cells column by column.
+    with pd.ExcelWriter(buf, engine="xlsxwriter", engine_kwargs={"options": {"strings_to_urls": False}}) as writer:
         pallets_df.to_excel(writer, index=False, sheet_name="pallets")
         drums_df.to_excel(writer, index=False, sheet_name="drums")
     buf.seek(0)
     return buf.getvalue()
 
 
+# The pooled SMTP connection is shared by every session thread; one send at a time.
+_SMTP_LOCK = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def _smtp_client(host: str, port: int, user: str, password: str) -> smtplib.SMTP:
+    server = smtplib.SMTP(host, port)
+    server.starttls()
+    server.login(user, password)
+    return server
+
+
 def send_report_email(to_email: str, subject: str, body: str, attachments: list[tuple[str, bytes, str]]):
     host = get_secret("SMTP_HOST")
     user = get_secret("SMTP_USER")
@@ -290,16 +427,19 @@ def send_report_email(to_email: str, subject: str, body: str, attachments: list[
         maintype, subtype = mime.split("/", 1)
         msg.add_attachment(content, maintype=maintype, subtype=subtype, filename=filename)
 
-    with smtplib.SMTP(host, port) as server:
-        server.starttls()
-        server.login(user, password)
-        server.send_message(msg)
+    with _SMTP_LOCK:
+        try:
+            _smtp_client(host, port, user, password).send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Pooled connection was closed by the server (idle timeout); reconnect once.
+            _smtp_client.clear()
+            _smtp_client(host, port, user, password).send_message(msg)
     return True, ""
 
 
 # -------------------- Google Sheets --------------------
 
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def get_gs_client():
     if gspread is None or Credentials is None:
         return None
@@ -308,7 +448,7 @@ def get_gs_client():
     sa_file = get_secret("GOOGLE_SERVICE_ACCOUNT_FILE")
 
     if sa_json:
-        info = json.loads(sa_json)
+        info = parse_service_account_json(sa_json)
     elif sa_file:
         with open(sa_file, "r", encoding="utf-8") as f:
             info = json.load(f)
@@ -324,7 +464,7 @@ def get_gs_client():
     creds = Credentials.from_service_account_info(info, scopes=scopes)
     return gspread.authorize(creds)
 
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def get_fs_client():
     sa_json = get_secret("FIREBASE_SERVICE_ACCOUNT_JSON")
     if not sa_json or firebase_admin is None or fb_credentials is None or fb_firestore is None:
@@ -335,21 +475,29 @@ def get_fs_client():
         firebase_admin.initialize_app(cred)
     return fb_firestore.client()
 
+@st.cache_resource(show_spinner=False)
+def get_apps_script_session() -> requests.Session:
+    # Shared keep-alive session so Apps Script calls reuse the TLS connection.
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
 def apps_script_call(url: str, payload: dict) -> dict:
     api_key = get_secret("GOOGLE_APPS_SCRIPT_KEY")
     if api_key and "apiKey" not in payload:
         payload["apiKey"] = api_key
-    data = json.dumps(payload).encode("utf-8")
-    req = Request(url, data=data, headers={"Content-Type": "application/json"})
+    data = json_dumps_bytes(payload)
     try:
-        with urlopen(req, timeout=20) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-    except HTTPError as exc:
-        raise RuntimeError(f"Apps Script error: {exc.code}") from exc
-    except URLError as exc:
+        resp = get_apps_script_session().post(url, data=data, timeout=20)
+        resp.raise_for_status()
+    except requests.HTTPError as exc:
+        raise RuntimeError(f"Apps Script error: {exc.response.status_code}") from exc
+    except requests.RequestException as exc:
         raise RuntimeError("Apps Script unreachable") from exc
+    raw = resp.content.decode("utf-8", errors="replace")
     try:
-        return json.loads(raw)
+        return json_loads(raw)
     except json.JSONDecodeError as exc:
         raise RuntimeError("Apps Script invalid response") from exc
 
@@ -426,12 +574,49 @@ class FirestoreCollection:
     def stream(self):
         return list(self._col().stream())
 
-    def query(self, filters: list[tuple]):
+    def query(self, filters: list[tuple], fields: list[str] | None = None):
         q = self._col()
         for field, op, value in filters:
             q = q.where(field, op, value)
+        if fields:
+            q = q.select(fields)
         return list(q.stream())
 
+    def count(self, filters: list[tuple]) -> int:
+        q = self._col()
+        for field, op, value in filters:
+            q = q.where(field, op, value)
+        result = q.count().get()
+        return int(result[0][0].value)
+
+
+# Worksheet handles are not hashable; cache them by backend + sheet identity.
+WORKSHEET_HASH_FUNCS = {
+    AppsScriptWorksheet: lambda ws: ("apps_script", ws.spreadsheet.url, ws.spreadsheet.sheet_id, ws.name),
+    FirestoreCollection: lambda ws: ("firestore", ws.name),
+}
+if gspread is not None:
+    WORKSHEET_HASH_FUNCS[gspread.Worksheet] = lambda ws: ("gspread", ws.spreadsheet_id, ws.title)
+    WORKSHEET_HASH_FUNCS[gspread.Spreadsheet] = lambda spreadsheet: ("gspread", spreadsheet.id)
+# Streamlit re-executes this module on every rerun, so the backend classes defined
+# here are new objects each time; look them up by name, as st.cache_data does.
+_WORKSHEET_KEY_FUNCS = {
+    f"{cls.__module__}.{cls.__qualname__}": func for cls, func in WORKSHEET_HASH_FUNCS.items()
+}
+
+
+@st.cache_resource(ttl=HEADERS_TTL, show_spinner=False)
+def _headers_cache() -> dict:
+    # Header rows rarely change; kept outside st.cache_data so that
+    # clear_cached_data() after every write does not force a refetch, and
+    # expired after HEADERS_TTL so a header edited in the sheet is picked up.
+    return {}
+
+
+def worksheet_key(ws) -> tuple:
+    cls = type(ws)
+    return _WORKSHEET_KEY_FUNCS[f"{cls.__module__}.{cls.__qualname__}"](ws)
+
 
 def bump_material_active(ws_materials, material_code: str, delta: int):
     if not material_code:
@@ -470,6 +655,13 @@ def get_or_create_spreadsheet(client, sheet_id: str | None, title: str | None):
     return spreadsheet, True
 
 
+@st.cache_resource(show_spinner=False)
+def open_spreadsheet(_client, sheet_id: str | None, title: str | None):
+    # open_by_key fetches sheet metadata; keep one handle per process (and never
+    # create a second spreadsheet on the next rerun when no id is configured).
+    return get_or_create_spreadsheet(_client, sheet_id, title)
+
+
 def ensure_worksheet(spreadsheet, name: str, headers: list[str]):
     # Firestore backend
     if isinstance(spreadsheet, FirestoreDatabase):
@@ -478,6 +670,7 @@ def ensure_worksheet(spreadsheet, name: str, headers: list[str]):
     if isinstance(spreadsheet, AppsScriptSpreadsheet):
         ws = spreadsheet.worksheet(name)
         ws._call("ensure", headers=headers)
+        _headers_cache().pop(worksheet_key(ws), None)
         return ws
 
     # gspread backend
@@ -486,16 +679,59 @@ def ensure_worksheet(spreadsheet, name: str, headers: list[str]):
     except Exception:
         ws = spreadsheet.add_worksheet(title=name, rows="1000", cols=str(len(headers)))
         ws.append_row(headers)
+        _headers_cache()[worksheet_key(ws)] = list(headers)
         return ws
 
     existing = ws.row_values(1)
     if existing != headers:
         if not existing:
             ws.append_row(headers)
+    _headers_cache()[worksheet_key(ws)] = existing or list(headers)
     return ws
 
 
-def load_sheet(ws) -> pd.DataFrame:
+def get_worksheet(spreadsheet, name: str):
+    # ensure_worksheet costs a round-trip; run it once per session per sheet.
+    ensured = st.session_state.setdefault("ws_ensured", {})
+    if name not in ensured:
+        ws = ensure_worksheet(spreadsheet, name, SHEET_TEMPLATES[name])
+        # gspread handles survive reruns; the Apps Script / Firestore wrappers are
+        # classes of this script, redefined on every rerun, so only rebuild those.
+        ensured[name] = ws if gspread is not None and isinstance(ws, gspread.Worksheet) else None
+        return ws
+    return ensured[name] or spreadsheet.worksheet(name)
+
+
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("string[pyarrow]")
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            # Blanks or text keep the column as-is.
+            if values.notna().all() and (values % 1 == 0).all():
+                df[col] = pd.to_numeric(values, downcast="integer")
+    return df
+
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def _load_spreadsheet_values(spreadsheet, names: tuple) -> dict:
+    # One values.batchGet for several sheets instead of a get_all_values per sheet.
+    response = spreadsheet.values_batch_get([f"'{name}'" for name in names])
+    values = {}
+    for name, value_range in zip(names, response.get("valueRanges", [])):
+        rows = value_range.get("values", [])
+        # batchGet trims trailing blanks; pad like get_all_values does.
+        values[name] = gspread.utils.fill_gaps(rows) if rows else []
+    return values
+
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def _load_sheet_cached(ws) -> pd.DataFrame:
     if isinstance(ws, FirestoreCollection):
         docs = ws.stream()
         rows = []
@@ -505,23 +741,97 @@ def load_sheet(ws) -> pd.DataFrame:
             rows.append(data)
         if not rows:
             return pd.DataFrame()
-        return pd.DataFrame(rows)
+        return _categorize(pd.DataFrame(rows))
 
-    values = ws.get_all_values()
+    if gspread is not None and isinstance(ws, gspread.Worksheet) and ws.title in BATCHED_SHEETS:
+        values = _load_spreadsheet_values(ws.spreadsheet, BATCHED_SHEETS).get(ws.title)
+    else:
+        values = ws.get_all_values()
     if not values:
         return pd.DataFrame()
     headers = values[0]
     rows = values[1:]
     df = pd.DataFrame(rows, columns=headers)
-    df["__row"] = range(2, len(rows) + 2)
+    df["__row"] = np.arange(2, len(rows) + 2, dtype=np.int32)
+    return _categorize(df)
+
+
+def load_sheet(ws) -> pd.DataFrame:
+    return _load_sheet_cached(ws)
+
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def load_sheet_with_dates(ws, date_col: str) -> pd.DataFrame:
+    # History frames are read-only, so the sheet row number is dropped here once.
+    df = load_sheet(ws).drop(columns=["__row"], errors="ignore")
+    if not df.empty and date_col in df.columns:
+        df[date_col] = parse_timestamps(df[date_col])
+        # Chronological with NaT last, so a date range is one searchsorted slice.
+        df = df.sort_values(date_col, kind="stable", na_position="last", ignore_index=True)
     return df
 
 
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    # now_ts() format first (no per-value format guessing); anything else falls back.
+    parsed = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors="coerce")
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        # Offsets ("...Z", "+02:00") are normalized to naive UTC so the column stays datetime64[ns].
+        fallback = pd.to_datetime(values[missing], errors="coerce", format="mixed", utc=True)
+        parsed[missing] = fallback.dt.tz_convert(None)
+    return parsed
+
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def load_sheet_indexed(ws, key_col: str) -> pd.DataFrame:
+    df = load_sheet(ws)
+    if df.empty or key_col not in df.columns:
+        return pd.DataFrame()
+    return df.set_index(key_col, drop=False)
+
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def load_drum_positions(ws_drums) -> dict:
+    # drum_number -> row positions in load_sheet_with_dates(ws_drums, "timestamp"),
+    # keyed on the worksheet so the history frame is never hashed.
+    df = load_sheet_with_dates(ws_drums, "timestamp")
+    if df.empty or "drum_number" not in df.columns:
+        return {}
+    return df.groupby("drum_number", observed=True, sort=False).indices
+
+
+def get_headers(ws) -> list[str]:
+    key = worksheet_key(ws)
+    cache = _headers_cache()
+    headers = cache.get(key)
+    if headers is None:
+        headers = ws.row_values(1)
+        if headers:
+            cache[key] = headers
+    return headers
+
+
+def contains_mask(values: pd.Series, needle: str) -> pd.Series:
+    # Case-insensitive literal substring match (users type codes, not regexes).
+    needle = needle.casefold()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Match the few distinct categories, then map back through the integer codes.
+        matches = values.cat.categories.astype(str).str.casefold().str.contains(needle, regex=False, na=False)
+        return values.cat.codes.isin(np.flatnonzero(matches))
+    return values.astype(str).str.casefold().str.contains(needle, regex=False, na=False)
+
+
+def get_row_ids(df: pd.DataFrame) -> list:
+    # Firestore rows are addressed by document id, sheet rows by row number.
+    if "__doc_id" in df.columns:
+        return df["__doc_id"].tolist()
+    return df["__row"].astype(int).tolist()
+
+
 def get_header_map(ws) -> dict:
     if isinstance(ws, FirestoreCollection):
         return {}
-    headers = ws.row_values(1)
-    return {h: i + 1 for i, h in enumerate(headers)}
+    return {h: i + 1 for i, h in enumerate(get_headers(ws))}
 
 
 def update_row(ws, row_idx: int, updates: dict):
@@ -529,10 +839,70 @@ def update_row(ws, row_idx: int, updates: dict):
         ws.update_doc(str(row_idx), updates)
         return
     header_map = get_header_map(ws)
-    for key, val in updates.items():
-        col = header_map.get(key)
-        if col:
-            ws.update_cell(row_idx, col, val)
+    cells = [(header_map[key], val) for key, val in updates.items() if header_map.get(key)]
+    if gspread is not None and isinstance(ws, gspread.Worksheet):
+        # One values.batchUpdate request instead of one round-trip per cell.
+        if cells:
+            ws.batch_update(
+                [{"range": gspread.utils.rowcol_to_a1(row_idx, col), "values": [[val]]} for col, val in cells],
+                raw=False,
+            )
+        return
+    for col, val in cells:
+        ws.update_cell(row_idx, col, val)
+
+
+def commit_firestore_writes(client, writes: list[tuple]):
+    # writes: [(document_ref, {field: value}), ...], merged in WriteBatch chunks.
+    for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+        batch = client.batch()
+        for doc_ref, data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.set(doc_ref, data, merge=True)
+        batch.commit()
+
+
+def batch_update_rows(ws, updates: list[tuple]):
+    # updates: [(row_idx or doc_id, {column: value}), ...]
+    if not updates:
+        return
+    if gspread is not None and isinstance(ws, gspread.Worksheet):
+        header_map = get_header_map(ws)
+        data = [
+            {"range": gspread.utils.rowcol_to_a1(row_idx, header_map[key]), "values": [[val]]}
+            for row_idx, row_updates in updates
+            for key, val in row_updates.items()
+            if header_map.get(key)
+        ]
+        if data:
+            ws.batch_update(data, raw=False)
+        return
+    for row_idx, row_updates in updates:
+        update_row(ws, row_idx, row_updates)
+
+
+def to_sheet_value(value) -> str:
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return str(value)
+
+
+def append_or_update(ws, key_col: str, row: dict, template: list[str]) -> str:
+    # row holds native values; Firestore stores them as-is, sheets get text.
+    key = row[key_col]
+    if isinstance(ws, FirestoreCollection):
+        ws.set_doc(key, row)
+        clear_cached_data()
+        return "saved"
+    df = load_sheet_indexed(ws, key_col)
+    if key in df.index:
+        row_idx = int(df.loc[[key]].iloc[0]["__row"])
+        update_row(ws, row_idx, {h: to_sheet_value(v) for h, v in row.items()})
+        result = "updated"
+    else:
+        ws.append_row([to_sheet_value(row.get(h, "")) for h in template])
+        result = "added"
+    clear_cached_data()
+    return result
 
 
 # -------------------- Data Helpers --------------------
@@ -552,65 +922,79 @@ def get_settings(ws_settings) -> dict:
     df = load_sheet(ws_settings)
     if df.empty:
         return {}
-    return {row["key"]: row["value"] for _, row in df.iterrows()}
+    return dict(zip(df["key"].tolist(), df["value"].astype(str).tolist()))
 
 
 def set_setting(ws_settings, key: str, value: str):
+    set_settings(ws_settings, {key: value})
+
+
+def set_settings(ws_settings, values: dict):
+    # Reads the settings sheet at most once for all keys, then invalidates once.
     if isinstance(ws_settings, FirestoreCollection):
-        try:
-            value_cast = int(value)
-        except Exception:
-            value_cast = value
-        ws_settings.update_doc("global", {key: value_cast})
+        updates = {}
+        for key, value in values.items():
+            try:
+                updates[key] = int(value)
+            except Exception:
+                updates[key] = value
+        ws_settings.update_doc("global", updates)
         clear_cached_data()
         return
     df = load_sheet(ws_settings)
-    if df.empty:
-        ws_settings.append_row([key, value])
-        return
-    row = df[df["key"] == key]
-    if row.empty:
-        ws_settings.append_row([key, value])
-    else:
-        row_idx = int(row.iloc[0]["__row"])
-        update_row(ws_settings, row_idx, {"value": value})
+    row_index = {}
+    if not df.empty:
+        for key, row_idx in zip(df["key"].tolist(), df["__row"].tolist()):
+            row_index.setdefault(key, row_idx)
+    updates = []
+    for key, value in values.items():
+        if key in row_index:
+            updates.append((int(row_index[key]), {"value": value}))
+        else:
+            ws_settings.append_row([key, value])
+    batch_update_rows(ws_settings, updates)
+    clear_cached_data()
 
 
-@st.cache_data(ttl=10, show_spinner=False, hash_funcs={FirestoreCollection: lambda _: "firestore"})
-def _get_materials_cached(ws_materials) -> pd.DataFrame:
-    df = load_sheet(ws_materials)
+def _prepare_materials(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
+    # Material writes resolve rows through load_sheet_indexed; callers get the frame
+    # without __row (load_sheet hands out a fresh copy, so deleting in place is safe).
+    if "__row" in df.columns:
+        del df["__row"]
     if "material_code" not in df.columns and "__doc_id" in df.columns:
         df["material_code"] = df["__doc_id"]
     if "active" in df.columns:
-        df["active"] = df["active"].apply(normalize_bool)
+        df["active"] = normalize_bool_series(df["active"])
     else:
         df["active"] = True
+    if "allow_incomplete" in df.columns:
+        df["allow_incomplete"] = normalize_bool_series(df["allow_incomplete"])
+    if "max_qty" in df.columns:
+        df["max_qty"] = pd.to_numeric(df["max_qty"], errors="coerce").fillna(0).astype("int32")
+    else:
+        df["max_qty"] = 0
     return df
 
 
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs={FirestoreCollection: lambda _: "firestore"})
+def _get_materials_cached(ws_materials) -> pd.DataFrame:
+    return _prepare_materials(load_sheet(ws_materials))
+
+
 def get_materials(ws_materials) -> pd.DataFrame:
     if isinstance(ws_materials, FirestoreCollection):
         return _get_materials_cached(ws_materials)
-    df = load_sheet(ws_materials)
-    if df.empty:
-        return df
-    if "material_code" not in df.columns and "__doc_id" in df.columns:
-        df["material_code"] = df["__doc_id"]
-    if "active" in df.columns:
-        df["active"] = df["active"].apply(normalize_bool)
-    else:
-        df["active"] = True
-    return df
+    return _prepare_materials(load_sheet(ws_materials))
 
 
 @st.cache_data(ttl=5, show_spinner=False, hash_funcs={FirestoreCollection: lambda _: "firestore"})
 def _get_active_drums_cached(ws_drums, material_code: str) -> pd.DataFrame:
-    docs = ws_drums.query([
-        ("material_code", "==", material_code),
-        ("status", "==", "ACTIVE"),
-    ])
+    docs = ws_drums.query(
+        [("material_code", "==", material_code), ("status", "==", "ACTIVE")],
+        fields=list(ACTIVE_DRUM_FIELDS),
+    )
     rows = []
     for doc in docs:
         data = doc.to_dict() or {}
@@ -621,54 +1005,77 @@ def _get_active_drums_cached(ws_drums, material_code: str) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def load_active_drums_indexed(ws_drums) -> pd.DataFrame:
+    df = load_sheet(ws_drums)
+    if df.empty or "status" not in df.columns or "material_code" not in df.columns:
+        return pd.DataFrame()
+    return df[df["status"] == "ACTIVE"].set_index("material_code", drop=False)
+
+
 def get_active_drums(ws_drums, material_code: str) -> pd.DataFrame:
     if isinstance(ws_drums, FirestoreCollection):
         return _get_active_drums_cached(ws_drums, material_code)
-    df = load_sheet(ws_drums)
-    if df.empty:
-        return df
-    return df[
-        (df["material_code"] == material_code)
-        & (df["status"] == "ACTIVE")
-    ]
+    df = load_active_drums_indexed(ws_drums)
+    if material_code not in df.index:
+        return pd.DataFrame()
+    return df.loc[[material_code]].reset_index(drop=True)
 
 
 @st.cache_data(ttl=5, show_spinner=False, hash_funcs={FirestoreCollection: lambda _: "firestore"})
-def _get_active_drum_counts_cached(ws_drums) -> dict:
+def _get_active_drum_counts_cached(ws_drums, material_codes: tuple = ()) -> dict:
+    if material_codes:
+        # Server-side count() per material instead of shipping every ACTIVE doc.
+        counts = {
+            code: ws_drums.count([("material_code", "==", code), ("status", "==", "ACTIVE")])
+            for code in material_codes
+        }
+        return {code: n for code, n in counts.items() if n}
     docs = ws_drums.query([("status", "==", "ACTIVE")])
-    counts: dict[str, int] = {}
-    for doc in docs:
-        data = doc.to_dict() or {}
-        code = data.get("material_code")
-        if code:
-            counts[code] = counts.get(code, 0) + 1
-    return counts
+    codes = ((doc.to_dict() or {}).get("material_code") for doc in docs)
+    return dict(Counter(code for code in codes if code))
 
 
-def get_active_drum_counts(ws_drums) -> dict:
+def get_active_drum_counts(ws_drums, material_codes: tuple = ()) -> dict:
     if isinstance(ws_drums, FirestoreCollection):
-        return _get_active_drum_counts_cached(ws_drums)
+        return _get_active_drum_counts_cached(ws_drums, tuple(material_codes))
     df = load_sheet(ws_drums)
     if df.empty:
         return {}
-    active = df[df["status"] == "ACTIVE"]
-    if active.empty or "material_code" not in active.columns:
+    if "material_code" not in df.columns:
         return {}
-    return active.groupby("material_code").size().to_dict()
+    active = df.loc[df["status"] == "ACTIVE", "material_code"]
+    counts = active.value_counts(sort=False)
+    # Categorical value_counts also reports unused categories with 0.
+    return counts[counts > 0].to_dict()
 
 
-def find_drum(ws_drums, drum_number: str) -> pd.DataFrame:
+def find_drum(ws_drums, drum_number: str) -> dict | None:
     if isinstance(ws_drums, FirestoreCollection):
         doc = ws_drums.get_doc(drum_number)
         if not doc.exists:
-            return pd.DataFrame()
+            return None
         data = doc.to_dict() or {}
         data["__doc_id"] = doc.id
-        return pd.DataFrame([data])
+        return data
     df = load_sheet(ws_drums)
-    if df.empty:
-        return df
-    return df[df["drum_number"] == drum_number]
+    if df.empty or "drum_number" not in df.columns:
+        return None
+    matches = df[df["drum_number"] == drum_number]
+    if matches.empty:
+        return None
+    return matches.iloc[0].to_dict()
+
+@st.cache_data(ttl=10, show_spinner=False, hash_funcs=WORKSHEET_HASH_FUNCS)
+def _load_pallet_dates(ws_pallets) -> dict:
+    df = load_sheet(ws_pallets)
+    if df.empty or "pallet_id" not in df.columns or "created_at" not in df.columns:
+        return {}
+    dates = {}
+    for pallet_id, created_at in zip(df["pallet_id"].tolist(), df["created_at"].tolist()):
+        dates.setdefault(pallet_id, created_at)
+    return dates
+
 
 def get_pallet_date(ws_pallets, pallet_id: str) -> str | None:
     if not pallet_id:
@@ -679,13 +1086,7 @@ def get_pallet_date(ws_pallets, pallet_id: str) -> str | None:
             return None
         data = doc.to_dict() or {}
         return data.get("created_at")
-    df = load_sheet(ws_pallets)
-    if df.empty:
-        return None
-    row = df[df["pallet_id"] == pallet_id]
-    if row.empty:
-        return None
-    return row.iloc[0].get("created_at")
+    return _load_pallet_dates(ws_pallets).get(pallet_id)
 
 
 def add_drum(ws_drums, row: dict):
@@ -696,16 +1097,18 @@ def add_drum(ws_drums, row: dict):
         ws_drums.set_doc(doc_id, row)
         clear_cached_data()
         return
-    headers = ws_drums.row_values(1)
+    headers = get_headers(ws_drums)
     ws_drums.append_row([row.get(h, "") for h in headers])
     clear_cached_data()
 
 def add_pallet(ws_pallets, pallet_id: str, row: dict):
     if isinstance(ws_pallets, FirestoreCollection):
         ws_pallets.set_doc(pallet_id, row)
+        clear_cached_data()
         return
-    headers = ws_pallets.row_values(1)
+    headers = get_headers(ws_pallets)
     ws_pallets.append_row([row.get(h, "") for h in headers])
+    clear_cached_data()
 
 def get_operator_name() -> str:
     return st.session_state.get("username") or get_secret("OPERATOR", "") or ""
@@ -729,9 +1132,7 @@ def clear_cached_data():
 
 # -------------------- UI Helpers --------------------
 
-def inject_css():
-    st.markdown(
-        """
+APP_CSS = """
 <style>
 :root {
   --bg: #f6f2ea;
@@ -782,9 +1183,11 @@ input[type="text"], input[type="number"] {
   .stButton > button { font-size: 1.05rem; padding: 1.1rem; }
 }
 </style>
-""",
-        unsafe_allow_html=True,
-    )
+"""
+
+
+def inject_css():
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
 
 def wake_lock_script():
@@ -806,11 +1209,59 @@ def wake_lock_script():
 
 # -------------------- Main App --------------------
 
+def _finalize_pallet(
+    complete_type: str,
+    ws_materials,
+    ws_drums,
+    ws_pallets,
+    ws_settings,
+    selected: str,
+    mat,
+    prefix: str,
+    active_drums: pd.DataFrame,
+):
+    settings = get_settings(ws_settings)
+    counter = int(settings.get("global_pallet_counter", "0"))
+    pallet_id = f"{prefix}{counter}"
+
+    drum_updates = [
+        (row_id, {"pallet_id": pallet_id, "status": "COMPLETED"}) for row_id in get_row_ids(active_drums)
+    ]
+
+    description = mat.get("description", "") or ""
+    email_subject = build_email_subject(selected, pallet_id)
+    email_body = build_email_body(selected, description, pallet_id, active_drums)
+    pallet_row = {
+        "pallet_id": pallet_id,
+        "material_code": selected,
+        "description": description,
+        "created_at": now_ts(),
+        "count": len(drum_updates),
+        "complete_type": complete_type,
+        "email_subject": email_subject,
+        "email_body": email_body,
+    }
+
+    if isinstance(ws_drums, FirestoreCollection):
+        # Drum statuses, the pallet, the counter and active_count commit together.
+        writes = [(ws_drums._col().document(str(doc_id)), data) for doc_id, data in drum_updates]
+        writes.append((ws_pallets._col().document(pallet_id), pallet_row))
+        writes.append((ws_settings._col().document("global"), {"global_pallet_counter": counter + 1}))
+        writes.append((ws_materials._col().document(selected), {"active_count": 0}))
+        commit_firestore_writes(ws_drums.client, writes)
+    else:
+        batch_update_rows(ws_drums, drum_updates)
+        add_pallet(ws_pallets, pallet_id, pallet_row)
+        set_setting(ws_settings, "global_pallet_counter", str(counter + 1))
+        set_material_active(ws_materials, selected, 0)
+    clear_cached_data()
+
+
 def operator_screen(spreadsheet):
-    ws_materials = ensure_worksheet(spreadsheet, "materials", SHEET_TEMPLATES["materials"])
-    ws_settings = ensure_worksheet(spreadsheet, "settings", SHEET_TEMPLATES["settings"])
-    ws_drums = ensure_worksheet(spreadsheet, "drums", SHEET_TEMPLATES["drums"])
-    ws_pallets = ensure_worksheet(spreadsheet, "pallets", SHEET_TEMPLATES["pallets"])
+    ws_materials = get_worksheet(spreadsheet, "materials")
+    ws_settings = get_worksheet(spreadsheet, "settings")
+    ws_drums = get_worksheet(spreadsheet, "drums")
+    ws_pallets = get_worksheet(spreadsheet, "pallets")
 
     materials_df = get_materials(ws_materials)
     active_materials = materials_df[materials_df["active"]] if not materials_df.empty else pd.DataFrame()
@@ -829,48 +1280,43 @@ def operator_screen(spreadsheet):
             return
 
         cols = st.columns(2)
-        counts_map = {}
+        cards = active_materials.reindex(columns=["material_code", "description", "max_qty", "active_count"])
+        codes = cards["material_code"].to_numpy()
+        descriptions = cards["description"].fillna("").to_numpy()
+        maxs = cards["max_qty"].to_numpy()
         if "active_count" in active_materials.columns:
-            for _, r in active_materials.iterrows():
-                code_val = r.get("material_code")
-                try:
-                    counts_map[code_val] = int(r.get("active_count") or 0)
-                except Exception:
-                    counts_map[code_val] = 0
+            counts = pd.to_numeric(cards["active_count"], errors="coerce").fillna(0).astype(int).to_numpy()
         else:
-            counts_map = get_active_drum_counts(ws_drums)
-        for idx, (_, row) in enumerate(active_materials.iterrows()):
-            code = row["material_code"]
-            description = row.get("description", "")
-            try:
-                max_qty = int(row.get("max_qty") or 0)
-            except Exception:
-                max_qty = 0
-            count = int(counts_map.get(code, 0))
-
-            if count == 0:
-                status = "GREEN"
-                status_label = "Empty"
-            elif count < max_qty:
-                status = "YELLOW"
-                status_label = "In progress"
-            else:
-                status = "FULL"
-                status_label = "Full"
+            counts_map = get_active_drum_counts(ws_drums, tuple(codes.tolist()))
+            counts = np.array([int(counts_map.get(c, 0)) for c in codes], dtype=int)
+        statuses = np.select([counts == 0, counts < maxs], ["GREEN", "YELLOW"], default="FULL")
+        status_styles = {
+            "GREEN": ("Empty", "status-green"),
+            "YELLOW": ("In progress", "status-yellow"),
+            "FULL": ("Full", "status-full"),
+        }
 
-            pill_class = "status-green" if status == "GREEN" else "status-yellow" if status == "YELLOW" else "status-full"
+        for idx, (code, description, max_qty, count, status) in enumerate(
+            zip(codes, descriptions, maxs.tolist(), counts.tolist(), statuses)
+        ):
+            status_label, pill_class = status_styles[status]
+
+            description_html = f"<p><em>{html.escape(str(description))}</em></p>" if description else ""
 
             with cols[idx % 2]:
-                st.markdown(f"<div class='card'>", unsafe_allow_html=True)
-                st.markdown(f"<span class='status-pill {pill_class}'>{status_label}</span>", unsafe_allow_html=True)
-                st.markdown(f"### Material {code}")
-                if description:
-                    st.markdown(f"_{description}_")
-                st.markdown(f"**{count} / {max_qty}**")
+                # One markdown element per tile instead of one per line.
+                st.markdown(
+                    f"<div class='card'>"
+                    f"<span class='status-pill {pill_class}'>{status_label}</span>"
+                    f"<h3>Material {html.escape(str(code))}</h3>"
+                    f"{description_html}"
+                    f"<p><strong>{count} / {max_qty}</strong></p>"
+                    f"</div>",
+                    unsafe_allow_html=True,
+                )
                 if st.button(f"Deschide {code}", key=f"open_{code}"):
                     st.session_state.selected_material = code
                     st.rerun()
-                st.markdown("</div>", unsafe_allow_html=True)
 
         st.markdown("---")
         footer_cols = st.columns([1, 1])
@@ -887,7 +1333,7 @@ def operator_screen(spreadsheet):
                 key="lang_select",
             )
             if choice != current:
-                st.session_state.lang = choice
+                set_lang(choice)
                 st.rerun()
         return
 
@@ -900,15 +1346,14 @@ def operator_screen(spreadsheet):
         return
 
     mat = row.iloc[0]
-    try:
-        max_qty = int(mat.get("max_qty") or 0)
-    except Exception:
-        max_qty = 0
+    max_qty = int(mat["max_qty"])
     prefix = mat.get("prefix", "") or ""
     allow_incomplete = normalize_bool(mat.get("allow_incomplete", False))
 
     active_drums = get_active_drums(ws_drums, selected)
     count = len(active_drums)
+    # Rebuilt every rerun; add/undo always st.rerun(), so it never goes stale.
+    active_drum_numbers = set(map(str, active_drums["drum_number"].to_numpy())) if not active_drums.empty else set()
 
     st.markdown(f"## Material {selected}")
     st.markdown(f"**{count} / {max_qty}**")
@@ -1006,13 +1451,12 @@ def operator_screen(spreadsheet):
                 return
 
             # Duplicate checks
-            if not active_drums.empty and drum_number in active_drums["drum_number"].tolist():
+            if drum_number in active_drum_numbers:
                 st.error(t("err_duplicate_current"))
                 return
 
-            existing = find_drum(ws_drums, drum_number)
-            if not existing.empty:
-                prior = existing.iloc[0]
+            prior = find_drum(ws_drums, drum_number)
+            if prior is not None:
                 pallet_id = prior.get("pallet_id", "")
                 pallet_date = get_pallet_date(ws_pallets, pallet_id)
                 if pallet_date:
@@ -1053,13 +1497,13 @@ def operator_screen(spreadsheet):
 
     # Undo last scan
     if st.button(t("btn_undo_last"), key="undo_scan"):
-        active_drums = get_active_drums(ws_drums, selected)
         if active_drums.empty:
             st.info("Nu exista scanari active.")
         else:
             if "__doc_id" in active_drums.columns:
-                last_doc = active_drums.sort_values("timestamp").iloc[-1]["__doc_id"]
-                delete_row(ws_drums, last_doc)
+                ts = pd.to_datetime(active_drums["timestamp"], errors="coerce")
+                last_pos = int(ts.argmax()) if ts.notna().any() else -1
+                delete_row(ws_drums, active_drums["__doc_id"].iloc[last_pos])
             else:
                 last_row = int(active_drums["__row"].max())
                 delete_row(ws_drums, last_row)
@@ -1085,37 +1529,9 @@ def operator_screen(spreadsheet):
         st.warning(t("confirm_generate"))
         col_yes, col_no = st.columns(2)
         if col_yes.button(t("btn_yes"), key="confirm_gen_yes"):
-            settings = get_settings(ws_settings)
-            counter = int(settings.get("global_pallet_counter", "0"))
-            pallet_id = f"{prefix}{counter}"
-
-            active_drums = get_active_drums(ws_drums, selected)
-            for _, row in active_drums.iterrows():
-                row_id = row["__doc_id"] if "__doc_id" in row else int(row["__row"])
-                update_row(ws_drums, row_id, {"pallet_id": pallet_id, "status": "COMPLETED"})
-
-            description = mat.get("description", "") or ""
-            email_subject = build_email_subject(selected, pallet_id)
-            email_body = build_email_body(selected, description, pallet_id, active_drums)
-
-            add_pallet(
-                ws_pallets,
-                pallet_id,
-                {
-                    "pallet_id": pallet_id,
-                    "material_code": selected,
-                    "description": description,
-                    "created_at": now_ts(),
-                    "count": len(active_drums),
-                    "complete_type": "FULL",
-                    "email_subject": email_subject,
-                    "email_body": email_body,
-                },
+            _finalize_pallet(
+                "FULL", ws_materials, ws_drums, ws_pallets, ws_settings, selected, mat, prefix, active_drums
             )
-
-            set_setting(ws_settings, "global_pallet_counter", str(counter + 1))
-            set_material_active(ws_materials, selected, 0)
-            clear_cached_data()
             st.session_state.confirm_generate = False
             st.success(t("pallet_generated"))
             st.session_state.selected_material = None
@@ -1132,37 +1548,9 @@ def operator_screen(spreadsheet):
             st.warning(t("confirm_incomplete"))
             col_yes, col_no = st.columns(2)
             if col_yes.button(t("btn_yes"), key="confirm_inc_yes"):
-                settings = get_settings(ws_settings)
-                counter = int(settings.get("global_pallet_counter", "0"))
-                pallet_id = f"{prefix}{counter}"
-
-                active_drums = get_active_drums(ws_drums, selected)
-                for _, row in active_drums.iterrows():
-                    row_id = row["__doc_id"] if "__doc_id" in row else int(row["__row"])
-                    update_row(ws_drums, row_id, {"pallet_id": pallet_id, "status": "COMPLETED"})
-
-                description = mat.get("description", "") or ""
-                email_subject = build_email_subject(selected, pallet_id)
-                email_body = build_email_body(selected, description, pallet_id, active_drums)
-
-                add_pallet(
-                    ws_pallets,
-                    pallet_id,
-                    {
-                        "pallet_id": pallet_id,
-                        "material_code": selected,
-                        "description": description,
-                        "created_at": now_ts(),
-                        "count": len(active_drums),
-                        "complete_type": "INCOMPLETE",
-                        "email_subject": email_subject,
-                        "email_body": email_body,
-                    },
+                _finalize_pallet(
+                    "INCOMPLETE", ws_materials, ws_drums, ws_pallets, ws_settings, selected, mat, prefix, active_drums
                 )
-
-                set_setting(ws_settings, "global_pallet_counter", str(counter + 1))
-                set_material_active(ws_materials, selected, 0)
-                clear_cached_data()
                 st.session_state.confirm_incomplete = False
                 st.success(t("pallet_incomplete_generated"))
                 st.session_state.selected_material = None
@@ -1173,88 +1561,45 @@ def operator_screen(spreadsheet):
 
 # -------------------- Admin Screen --------------------
 
-def admin_screen(spreadsheet):
-    ws_materials = ensure_worksheet(spreadsheet, "materials", SHEET_TEMPLATES["materials"])
-    ws_settings = ensure_worksheet(spreadsheet, "settings", SHEET_TEMPLATES["settings"])
-    ws_drums = ensure_worksheet(spreadsheet, "drums", SHEET_TEMPLATES["drums"])
-    ws_pallets = ensure_worksheet(spreadsheet, "pallets", SHEET_TEMPLATES["pallets"])
-
-    st.markdown(f"## {APP_TITLE} - Admin")
+def display_frame(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    # Only the sheet template columns go to the browser; ids, counters and the
+    # Firestore-only email fields stay out of the Arrow payload.
+    return df[[col for col in SHEET_TEMPLATES[name] if col in df.columns]]
 
-    # Settings
-    settings = get_settings(ws_settings)
-    current_counter = settings.get("global_pallet_counter", "0")
-    current_report_email = settings.get("report_email", "")
-    with st.form("settings_form"):
-        new_counter = st.text_input("Global pallet counter", value=current_counter)
-        report_email = st.text_input(t("label_reports_email"), value=current_report_email)
-        save_settings = st.form_submit_button("Salveaza setari")
-    if save_settings:
-        set_setting(ws_settings, "global_pallet_counter", new_counter)
-        set_setting(ws_settings, "report_email", report_email)
-        st.success("Setari salvate.")
-
-    st.markdown("---")
-
-    # Materials management
-    st.markdown(f"### {t('label_materials')}")
-    materials_df = get_materials(ws_materials)
-    if not materials_df.empty:
-        st.dataframe(materials_df.drop(columns=["__row"], errors="ignore"), use_container_width=True)
-
-    with st.form("material_form"):
-        material_code = st.text_input("Material code")
-        description = st.text_input("Description")
-        max_qty = st.number_input("Max qty / pallet", min_value=1, step=1)
-        prefix = st.text_input("Prefix (optional)")
-        allow_incomplete = st.checkbox(t("label_allow_incomplete"))
-        active = st.checkbox("Active", value=True)
-        save_material = st.form_submit_button("Adauga / Update")
 
-    if save_material:
-        df = get_materials(ws_materials)
-        existing = df[df["material_code"] == material_code] if not df.empty else pd.DataFrame()
-        if isinstance(ws_materials, FirestoreCollection):
-            row_data = {
-                "material_code": material_code,
-                "description": description,
-                "max_qty": int(max_qty),
-                "prefix": prefix,
-                "allow_incomplete": bool(allow_incomplete),
-                "active": bool(active),
-            }
-            ws_materials.set_doc(material_code, row_data)
-            clear_cached_data()
-            st.success("Material salvat.")
-        else:
-            row_data = {
-                "material_code": material_code,
-                "description": description,
-                "max_qty": str(int(max_qty)),
-                "prefix": prefix,
-                "allow_incomplete": "TRUE" if allow_incomplete else "FALSE",
-                "active": "TRUE" if active else "FALSE",
-            }
-            if existing.empty:
-                ws_materials.append_row([row_data[h] for h in SHEET_TEMPLATES["materials"]])
-                clear_cached_data()
-                st.success("Material adaugat.")
-            else:
-                row_idx = int(existing.iloc[0]["__row"])
-                update_row(ws_materials, row_idx, row_data)
-                clear_cached_data()
-                st.success("Material actualizat.")
+def drum_search(ws_drums, drums_df: pd.DataFrame | None):
+    # A form, so the lookup runs on Enter / Cauta instead of on every keystroke.
+    with st.form("drum_search_form"):
+        search_drum = st.text_input("Cauta drum number")
+        st.form_submit_button("Cauta")
+    if not search_drum:
+        return
+    if drums_df is None and isinstance(ws_drums, FirestoreCollection):
+        # History not loaded: drum_number is the document id, so one read is every match.
+        record = find_drum(ws_drums, search_drum)
+        result = pd.DataFrame([record]) if record is not None else pd.DataFrame()
+    else:
+        if drums_df is None:
+            # Sheets have no row query here; search the cached history frame instead.
+            drums_df = load_sheet_with_dates(ws_drums, "timestamp")
+        positions = load_drum_positions(ws_drums).get(search_drum)
+        result = drums_df.iloc[positions] if positions is not None else pd.DataFrame()
+    if result.empty:
+        st.info("Nu exista acest drum number.")
+    else:
+        st.dataframe(display_frame(result, "drums"), use_container_width=True, hide_index=True)
 
-    st.markdown("---")
 
-    # History / Search
+@st.fragment
+def history_section(ws_pallets, ws_drums, report_email: str):
     st.markdown("### History & Reports")
     load_history = st.checkbox("Incarca history (poate dura)")
-    pallets_df = pd.DataFrame()
-    drums_df = pd.DataFrame()
-    if load_history:
-        pallets_df = load_sheet(ws_pallets)
-        drums_df = load_sheet(ws_drums)
+    if not load_history:
+        # Skip filters, exports and tables; the drum search can still run as a point lookup.
+        drum_search(ws_drums, None)
+        return
+    pallets_df = load_sheet_with_dates(ws_pallets, "created_at")
+    drums_df = load_sheet_with_dates(ws_drums, "timestamp")
 
     # Date filters
     date_filter = st.selectbox("Filtru data", ["Toate", "Astazi", "Luna curenta", "An curent", "Interval"])
@@ -1266,48 +1611,54 @@ def admin_screen(spreadsheet):
         start_date = cols[0].date_input("De la")
         end_date = cols[1].date_input("Pana la")
 
+    # One clock read per run: the date bounds and the report name share it.
+    today = pd.Timestamp(datetime.utcnow()).normalize()
+    report_date = today.date().isoformat()
+    # Half-open [start, end) bounds over the sorted datetime64 column.
+    date_bounds = None
+    if date_filter == "Astazi":
+        date_bounds = (today, today + pd.Timedelta(days=1))
+    elif date_filter == "Luna curenta":
+        month_start = today.replace(day=1)
+        date_bounds = (month_start, month_start + pd.DateOffset(months=1))
+    elif date_filter == "An curent":
+        year_start = today.replace(month=1, day=1)
+        date_bounds = (year_start, year_start + pd.DateOffset(years=1))
+    elif date_filter == "Interval" and start_date and end_date:
+        date_bounds = (pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
+
     def apply_date_filter(df: pd.DataFrame, col: str):
-        if df.empty or col not in df.columns:
+        # "Toate" (and an incomplete interval) leaves date_bounds unset: the frame as-is.
+        if date_bounds is None or df.empty or col not in df.columns:
             return df
-        df = df.copy()
-        df[col] = pd.to_datetime(df[col], errors="coerce")
-        if date_filter == "Astazi":
-            return df[df[col].dt.date == datetime.utcnow().date()]
-        if date_filter == "Luna curenta":
-            now = datetime.utcnow()
-            return df[(df[col].dt.year == now.year) & (df[col].dt.month == now.month)]
-        if date_filter == "An curent":
-            now = datetime.utcnow()
-            return df[df[col].dt.year == now.year]
-        if date_filter == "Interval" and start_date and end_date:
-            return df[(df[col].dt.date >= start_date) & (df[col].dt.date <= end_date)]
-        return df
+        # Frames from load_sheet_with_dates are sorted by col; NaT sorts past every bound.
+        lo, hi = df[col].searchsorted(list(date_bounds))
+        return df.iloc[lo:hi]
 
-    pallets_view = apply_date_filter(pallets_df, "created_at") if not pallets_df.empty else pallets_df
-    drums_view = apply_date_filter(drums_df, "timestamp") if not drums_df.empty else drums_df
+    pallets_view = apply_date_filter(pallets_df, "created_at")
+    drums_view = apply_date_filter(drums_df, "timestamp")
     if material_filter:
         if not pallets_view.empty and "material_code" in pallets_view.columns:
-            pallets_view = pallets_view[pallets_view["material_code"].astype(str).str.contains(material_filter, case=False, na=False)]
+            pallets_view = pallets_view[contains_mask(pallets_view["material_code"], material_filter)]
         if not drums_view.empty and "material_code" in drums_view.columns:
-            drums_view = drums_view[drums_view["material_code"].astype(str).str.contains(material_filter, case=False, na=False)]
+            drums_view = drums_view[contains_mask(drums_view["material_code"], material_filter)]
 
     st.markdown("### Export")
     export_cols = st.columns(2)
-    report_email = settings.get("report_email", "").strip()
 
     def send_report(kind: str):
         if not report_email:
             st.warning("Seteaza Reports email in Admin.")
             return
-        subject = f"{APP_TITLE} Report - {today_date()}"
+        subject = f"{APP_TITLE} Report - {report_date}"
         body = "Attached: pallets + drums export."
         if kind == "csv":
             content = build_report_zip(pallets_view, drums_view)
-            filename = f"report_{today_date()}.zip"
+            filename = f"report_{report_date}.zip"
             mime = "application/zip"
         else:
             content = build_report_excel(pallets_view, drums_view)
-            filename = f"report_{today_date()}.xlsx"
+            filename = f"report_{report_date}.xlsx"
             mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         ok, err = send_report_email(report_email, subject, body, [(filename, content, mime)])
         if ok:
@@ -1321,19 +1672,73 @@ def admin_screen(spreadsheet):
         send_report("excel")
 
     if not pallets_view.empty:
-        st.dataframe(pallets_view.drop(columns=["__row"], errors="ignore"), use_container_width=True)
+        st.dataframe(display_frame(pallets_view, "pallets"), use_container_width=True, hide_index=True)
 
     st.markdown("### Toate scanarile")
     if not drums_view.empty:
-        st.dataframe(drums_view.drop(columns=["__row"], errors="ignore"), use_container_width=True)
+        st.dataframe(display_frame(drums_view, "drums"), use_container_width=True, hide_index=True)
 
-    search_drum = st.text_input("Cauta drum number")
-    if search_drum:
-        result = drums_df[drums_df["drum_number"] == search_drum] if not drums_df.empty else pd.DataFrame()
-        if result.empty:
-            st.info("Nu exista acest drum number.")
-        else:
-            st.dataframe(result.drop(columns=["__row"], errors="ignore"), use_container_width=True)
+    drum_search(ws_drums, drums_df)
+
+
+def admin_screen(spreadsheet):
+    ws_materials = get_worksheet(spreadsheet, "materials")
+    ws_settings = get_worksheet(spreadsheet, "settings")
+    ws_drums = get_worksheet(spreadsheet, "drums")
+    ws_pallets = get_worksheet(spreadsheet, "pallets")
+
+    st.markdown(f"## {APP_TITLE} - Admin")
+
+    # Settings
+    settings = get_settings(ws_settings)
+    current_counter = settings.get("global_pallet_counter", "0")
+    current_report_email = settings.get("report_email", "")
+    with st.form("settings_form"):
+        new_counter = st.text_input("Global pallet counter", value=current_counter)
+        report_email = st.text_input(t("label_reports_email"), value=current_report_email)
+        save_settings = st.form_submit_button("Salveaza setari")
+    if save_settings:
+        set_settings(ws_settings, {"global_pallet_counter": new_counter, "report_email": report_email})
+        st.success("Setari salvate.")
+
+    st.markdown("---")
+
+    # Materials management
+    st.markdown(f"### {t('label_materials')}")
+    materials_df = get_materials(ws_materials)
+    if not materials_df.empty:
+        st.dataframe(display_frame(materials_df, "materials"), use_container_width=True, hide_index=True)
+
+    with st.form("material_form"):
+        material_code = st.text_input("Material code")
+        description = st.text_input("Description")
+        max_qty = st.number_input("Max qty / pallet", min_value=1, step=1)
+        prefix = st.text_input("Prefix (optional)")
+        allow_incomplete = st.checkbox(t("label_allow_incomplete"))
+        active = st.checkbox("Active", value=True)
+        save_material = st.form_submit_button("Adauga / Update")
+
+    if save_material:
+        result = append_or_update(
+            ws_materials,
+            "material_code",
+            {
+                "material_code": material_code,
+                "description": description,
+                "max_qty": int(max_qty),
+                "prefix": prefix,
+                "allow_incomplete": bool(allow_incomplete),
+                "active": bool(active),
+            },
+            SHEET_TEMPLATES["materials"],
+        )
+        messages = {"saved": "Material salvat.", "added": "Material adaugat.", "updated": "Material actualizat."}
+        st.success(messages[result])
+
+    st.markdown("---")
+
+    # History / Search (a fragment: its widgets rerun only this section)
+    history_section(ws_pallets, ws_drums, settings.get("report_email", "").strip())
 
 
 def main():
@@ -1355,7 +1760,7 @@ def main():
         spreadsheet = AppsScriptSpreadsheet(apps_script_url, sheet_id)
         created = False
     elif client:
-        spreadsheet, created = get_or_create_spreadsheet(client, sheet_id, sheet_title)
+        spreadsheet, created = open_spreadsheet(client, sheet_id, sheet_title)
     else:
         st.error(
             "Nu exista backend configurat. Seteaza FIREBASE_SERVICE_ACCOUNT_JSON "
@@ -1363,7 +1768,9 @@ def main():
         )
         st.stop()
 
-    if created:
+    # open_spreadsheet keeps (spreadsheet, created) for the process; warn once per session.
+    if created and not st.session_state.get("created_notice_shown"):
+        st.session_state.created_notice_shown = True
         st.warning(
             f"Am creat un nou Google Sheet: {spreadsheet.title}. "
             f"ID: {spreadsheet.id}. Actualizeaza GOOGLE_SHEET_ID cu acest ID."
@@ -1375,7 +1782,7 @@ def main():
         st.session_state.username = ""
 
     if "lang" not in st.session_state:
-        st.session_state.lang = "RO"
+        set_lang("RO")
 
     if not st.session_state.auth_role:
         st.markdown(f"## {t('label_login')}")